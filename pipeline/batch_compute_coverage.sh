@@ -4,7 +4,7 @@
 usage() {
     echo "Usage: $0 -i <input_folder> -o <output_folder> -s <strandedness>"
     echo "-g <genome_folder> -f <fai_file_name>"
-    echo "[-d <docker_image_path>] [-l <slurm_log_folder>] [-L]"
+    echo "[-d <docker_image_path>] [-l <slurm_log_folder>] [-L] [-n]"
     exit 1
 }
 
@@ -17,7 +17,7 @@ output_folder=""
 strandedness=""
 genome_folder=""
 fai_file_name=""
-
+count_introns_flag=""
 
 run_locally=false
 docker_image_path="$repository_path"/docker_images/bioinfo_tools.tar
@@ -25,7 +25,7 @@ slurm_log_folder="$repository_path"/slurm_logs
 
 
 # Parse command line arguments
-while getopts ":i:o:d:s:g:f:l:L" opt; do
+while getopts ":i:o:d:s:g:f:l:Ln" opt; do
     case ${opt} in
         i )
             input_folder=$OPTARG
@@ -51,6 +51,9 @@ while getopts ":i:o:d:s:g:f:l:L" opt; do
         L )
             run_locally=true
             ;;
+        n )
+            count_introns_flag="-n"
+            ;;
         \? )
             echo "Invalid option: $OPTARG" 1>&2
             usage
@@ -77,11 +80,11 @@ for sub_folder in "$input_folder"/*; do
   if [ "$run_locally" = true ]; then
     echo "Processing sample $sample_name"
     sh "$repository_path"/scripts/compute_coverage.sh -i "$sub_folder" -o "$output_folder"/"$sample_name" \
-    -d "$docker_image_path" -s "$strandedness" -c "$repository_path"/scripts -g "$genome_folder" -f "$fai_file_name"
+    -d "$docker_image_path" -s "$strandedness" -c "$repository_path"/scripts -g "$genome_folder" -f "$fai_file_name" $count_introns_flag
   else
     echo "Submitting sample $sample_name"
     sbatch --output="$slurm_log_folder"/%j_%x.log --error="$slurm_log_folder"/%j_%x.err \
     "$repository_path"/scripts/compute_coverage.sh -i "$sub_folder" -o "$output_folder"/"$sample_name" \
-    -d "$docker_image_path" -s "$strandedness" -c "$repository_path"/scripts -g "$genome_folder" -f "$fai_file_name"
+    -d "$docker_image_path" -s "$strandedness" -c "$repository_path"/scripts -g "$genome_folder" -f "$fai_file_name" $count_introns_flag
   fi
 done
@@ -10,6 +10,10 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--project_folder',
                         default='/cellfile/datapublic/jkoubele/celegans_mutants')
+    parser.add_argument('--counts_source', choices=['intron_slopes', 'coverage'], default='intron_slopes',
+                        help="Either 'intron_slopes' (counts from slopes_by_definition.tsv), or 'coverage' "
+                             "(intron_counts.tsv written by extract_pairs_and_nascent_introns.py with "
+                             "--count_introns, which does not require the slope estimation).")
     args = parser.parse_args()
     project_folder = Path(args.project_folder)
 
@@ -28,12 +32,18 @@ if __name__ == "__main__":
     intron_read_counts: Optional[pd.DataFrame] = None
 
     for sample_name in sample_annotation['sample_name']:
-        slopes_df = pd.read_csv(project_folder / 'intron_slopes' / sample_name / 'slopes_by_definition.tsv',
-                                sep='\t')
-        slopes_df = slopes_df.dropna()
+        if args.counts_source == 'coverage':
+            counts_df = pd.read_csv(project_folder / 'coverage' / sample_name / 'intron_counts.tsv', sep='\t')
+            counts_df = counts_df.dropna(subset=['count'])
+            counts_df['count'] = counts_df['count'].astype(int)
+        else:
+            counts_df = pd.read_csv(project_folder / 'intron_slopes' / sample_name / 'slopes_by_definition.tsv',
+                                    sep='\t')
+            counts_df = counts_df.dropna()
+            counts_df['count'] = counts_df['coverage_5_prime'] - counts_df['coverage_3_prime']
         if intron_read_counts is None:
-            intron_read_counts = slopes_df[['name', 'chromosome', 'start', 'end', 'strand', 'length']]
-        intron_read_counts[sample_name] = (slopes_df['coverage_5_prime'] - slopes_df['coverage_3_prime'])
+            intron_read_counts = counts_df[['name', 'chromosome', 'start', 'end', 'strand', 'length']]
+        intron_read_counts[sample_name] = counts_df['count']
 
     intron_read_counts = intron_read_counts.rename(columns={'name': 'gene'})
     # C. Elegans have only  361 out of 74k introns overlapping --> we just drop them:
@@ -6,7 +6,7 @@
 # Function to display usage information
 usage() {
     echo "Usage: $0 -i <input_folder> -o <output_folder> -d <docker_image_path>"
-    echo " -s <strandedness> -c <script_folder> -g <genome_folder> -f <fai_file_name>"
+    echo " -s <strandedness> -c <script_folder> -g <genome_folder> -f <fai_file_name> [-n]"
     exit 1
 }
 
@@ -18,10 +18,10 @@ strandedness=""
 script_folder=""
 genome_folder=""
 fai_file_name=""
-
+count_introns_argument=""
 
 # Parse command line arguments
-while getopts ":i:o:d:s:c:g:f:" opt; do
+while getopts ":i:o:d:s:c:g:f:n" opt; do
     case ${opt} in
         i )
             input_folder=$OPTARG
@@ -44,6 +44,9 @@ while getopts ":i:o:d:s:c:g:f:" opt; do
         f )
             fai_file_name=$OPTARG
             ;;
+        n )
+            count_introns_argument="--count_introns"
+            ;;
         \? )
             echo "Invalid option: $OPTARG" 1>&2
             usage
@@ -76,6 +79,6 @@ docker run --rm -v "$input_folder":/input_folder -v "$output_folder":/output_fol
 bioinfo_tools /bin/sh -c "
 python3 /script_folder/extract_pairs_and_nascent_introns.py \
 --input_folder /input_folder --output_folder /output_folder --strandendess_type $strandedness \
---introns_bed_file /genome_folder/introns.bed --fai_index_file genome_folder/$fai_file_name;  \
+--introns_bed_file /genome_folder/introns.bed --fai_index_file genome_folder/$fai_file_name $count_introns_argument;  \
 sh /script_folder/bed_sort_and_coverage.sh -f $fai_file_name; \
 chmod 777 -R /output_folder"
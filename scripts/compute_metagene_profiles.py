@@ -0,0 +1,221 @@
+import os
+
+os.environ[
+    'OPENBLAS_NUM_THREADS'] = '1'  # solves weird error when importing numpy (and consequently e.g. pandas, biopython etc.) on cluster
+
+import argparse
+import logging
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(
+    format='%(asctime)s %(levelname)-8s %(message)s',
+    level=logging.DEBUG,
+    datefmt='%Y-%m-%d %H:%M:%S',
+    handlers=[logging.StreamHandler(sys.stdout)])
+
+
+def load_introns(introns_bed_file: Path) -> pd.DataFrame:
+    introns_df = pd.read_csv(introns_bed_file, sep='\t',
+                             names=['chromosome', 'start', 'end', 'name', 'score', 'strand'])
+    introns_df['chromosome'] = introns_df['chromosome'].astype(str)
+    introns_df['length'] = introns_df['end'] - introns_df['start']
+    return introns_df
+
+
+def compute_bin_edges(introns_df: pd.DataFrame, num_bins: int, padding: int, min_length: int) -> np.ndarray:
+    """
+    Compute genomic positions of bin edges for all introns at once. Edges are oriented from 5' to 3' end of the intron
+    (i.e. they are decreasing for introns on the reverse strand), and padding is removed from both ends of the intron.
+    :param introns_df: Introns, as loaded by load_introns().
+    :param num_bins: Number of bins per intron.
+    :param padding: Number of bases removed from both ends of the intron.
+    :param min_length: Introns with length up to min_length are excluded.
+    :return: Array of shape (num_introns, num_bins + 1); rows of excluded introns are NaN.
+    """
+    start = (introns_df['start'] + padding).to_numpy(dtype=float)
+    end = (introns_df['end'] - padding).to_numpy(dtype=float)
+    bin_edges = start[:, None] + (end - start)[:, None] * np.linspace(0, 1, num_bins + 1)[None, :]
+
+    is_reverse = (introns_df['strand'] == '-').to_numpy()
+    bin_edges[is_reverse] = bin_edges[is_reverse, ::-1]
+
+    length = introns_df['length'].to_numpy()
+    bin_edges[(length <= min_length) | (length <= 2 * padding)] = np.nan
+    return bin_edges
+
+
+def integrate_coverage(positions: np.ndarray,
+                       interval_starts: np.ndarray,
+                       interval_ends: np.ndarray,
+                       interval_scores: np.ndarray) -> np.ndarray:
+    """
+    Compute integral of coverage from the start of the chromosome up to given (possibly non-integer) positions.
+    :param positions: Array of arbitrary shape with positions on the chromosome.
+    :param interval_starts: Sorted starts of non-overlapping bedGraph intervals.
+    :param interval_ends: Ends of the bedGraph intervals.
+    :param interval_scores: Coverage of the bedGraph intervals.
+    :return: Array of the same shape as positions.
+    """
+    interval_lengths = interval_ends - interval_starts
+    cumulative_coverage = np.concatenate(([0.0], np.cumsum(interval_scores * interval_lengths)))
+    interval_index = np.searchsorted(interval_starts, positions, side='right') - 1
+    clipped_index = np.clip(interval_index, 0, None)
+    coverage_within_interval = interval_scores[clipped_index] * np.clip(positions - interval_starts[clipped_index],
+                                                                        0, interval_lengths[clipped_index])
+    return np.where(interval_index >= 0, cumulative_coverage[clipped_index] + coverage_within_interval, 0.0)
+
+
+def compute_sample_profiles(coverage_folder: Path,
+                            introns_df: pd.DataFrame,
+                            coverage_type: str,
+                            num_bins: int,
+                            padding: int,
+                            min_length: int,
+                            library_size: int) -> np.ndarray:
+    """
+    Compute mean coverage (normalized to reads per million) in bins along all introns of one sample.
+    :param coverage_folder: Folder with the output of compute_coverage.sh for the given sample.
+    :param introns_df: Introns, as loaded by load_introns().
+    :param coverage_type: Either 'pairs' or 'nascent_introns'.
+    :param num_bins: Number of bins per intron.
+    :param padding: Number of bases removed from both ends of the intron.
+    :param min_length: Introns with length up to min_length are excluded.
+    :param library_size: Number of reads used for normalization.
+    :return: Array of shape (num_introns, num_bins), oriented from 5' to 3' end of the introns.
+    """
+    bin_edges = compute_bin_edges(introns_df, num_bins=num_bins, padding=padding, min_length=min_length)
+    is_valid = ~np.isnan(bin_edges[:, 0])
+    profiles = np.full((len(introns_df), num_bins), np.nan)
+    profiles[is_valid] = 0.0
+    intron_chromosomes = introns_df['chromosome'].to_numpy()
+    intron_strands = introns_df['strand'].to_numpy()
+
+    for strand, file_prefix in (('+', 'forward'), ('-', 'reverse')):
+        bed_graph = pd.read_csv(coverage_folder / f"coverage_{file_prefix}_{coverage_type}.bedGraph", sep='\t',
+                                names=['chromosome', 'start', 'end', 'score'], dtype={'chromosome': str})
+        for chromosome, chromosome_coverage in bed_graph.groupby('chromosome', sort=False):
+            selected_introns = is_valid & (intron_chromosomes == chromosome) & (intron_strands == strand)
+            if not selected_introns.any():
+                continue
+            chromosome_coverage = chromosome_coverage.sort_values('start')
+            selected_edges = bin_edges[selected_introns]
+            coverage_integral = integrate_coverage(positions=selected_edges,
+                                                   interval_starts=chromosome_coverage['start'].to_numpy(),
+                                                   interval_ends=chromosome_coverage['end'].to_numpy(),
+                                                   interval_scores=chromosome_coverage['score'].to_numpy(dtype=float))
+            # Edges of introns on reverse strand are decreasing, which is handled by taking the absolute values
+            profiles[selected_introns] = (np.abs(np.diff(coverage_integral, axis=1)) /
+                                          np.abs(np.diff(selected_edges, axis=1)))
+
+    return (profiles / library_size * 1e6).astype(np.float32)
+
+
+def compute_metagene_profiles(project_folder: Path,
+                              introns_bed_file: Path,
+                              coverage_type: str = 'pairs',
+                              num_bins: int = 100,
+                              padding: int = 20,
+                              min_length: int = 50,
+                              condition_columns: Optional[list[str]] = None,
+                              num_processes: Optional[int] = None) -> None:
+    """
+    Compute binned intronic coverage profiles for all samples and introns, and summarize them by conditions.
+    Samples are processed in parallel, and the profiles are written to a memory-mapped array of shape
+    (num_samples, num_introns, num_bins) as they are computed.
+    :param project_folder: Project folder, containing subfolders 'coverage' and 'sample_annotation'.
+    :param introns_bed_file: Introns in .bed format.
+    :param coverage_type: Either 'pairs' or 'nascent_introns'.
+    :param num_bins: Number of bins per intron.
+    :param padding: Number of bases removed from both ends of the intron.
+    :param min_length: Introns with length up to min_length are excluded.
+    :param condition_columns: Columns of the sample annotation by which the profiles are summarized. If None, all
+    columns except of 'sample_name' and 'library_size' are used.
+    :param num_processes: Number of samples processed in parallel.
+    :return: None.
+    """
+    assert coverage_type in ['pairs', 'nascent_introns'], "coverage_type must be either 'pairs' or 'nascent_introns'"
+    output_folder = project_folder / 'metagene_profiles'
+    output_folder.mkdir(exist_ok=True)
+
+    # Sample annotation with library sizes is created by aggregate_intronic_counts.py
+    sample_annotation = pd.read_csv(project_folder / 'sample_annotation' / 'sample_annotation_with_library_size.tsv',
+                                    sep='\t')
+    if condition_columns is None:
+        condition_columns = [column for column in sample_annotation.columns
+                             if column not in ('sample_name', 'library_size')]
+
+    introns_df = load_introns(introns_bed_file)
+    introns_df[['chromosome', 'start', 'end', 'name', 'strand', 'length']].to_csv(output_folder / 'introns.tsv',
+                                                                                  sep='\t', index=False)
+
+    profiles = np.lib.format.open_memmap(output_folder / 'profiles.npy', mode='w+', dtype=np.float32,
+                                         shape=(len(sample_annotation), len(introns_df), num_bins))
+    sample_metagenes = np.zeros((len(sample_annotation), num_bins))
+
+    with ProcessPoolExecutor(max_workers=num_processes) as executor:
+        futures = {executor.submit(compute_sample_profiles,
+                                   coverage_folder=project_folder / 'coverage' / sample_name,
+                                   introns_df=introns_df[['chromosome', 'start', 'end', 'strand', 'length']],
+                                   coverage_type=coverage_type,
+                                   num_bins=num_bins,
+                                   padding=padding,
+                                   min_length=min_length,
+                                   library_size=library_size): sample_index
+                   for sample_index, (sample_name, library_size) in enumerate(zip(sample_annotation['sample_name'],
+                                                                                  sample_annotation['library_size']))}
+        for future in as_completed(futures):
+            sample_index = futures[future]
+            sample_profiles = future.result()
+            profiles[sample_index] = sample_profiles
+            sample_metagenes[sample_index] = np.nanmean(sample_profiles, axis=0)
+            logging.info(f"Computed profiles of sample {sample_annotation['sample_name'][sample_index]}")
+    profiles.flush()
+
+    bin_columns = [f"bin_{i}" for i in range(num_bins)]
+    sample_metagenes_df = pd.DataFrame(sample_metagenes, columns=bin_columns)
+    sample_metagenes_df.insert(0, 'sample_name', sample_annotation['sample_name'])
+    sample_metagenes_df.to_csv(output_folder / 'sample_profiles.tsv', sep='\t', index=False)
+
+    condition_summaries: list[pd.DataFrame] = []
+    for condition_column in condition_columns:
+        for condition, condition_samples in sample_annotation.groupby(condition_column).groups.items():
+            condition_metagenes = sample_metagenes[sample_annotation.index.get_indexer(condition_samples)]
+            condition_summaries.append(pd.DataFrame({'condition_column': condition_column,
+                                                     'condition': condition,
+                                                     'num_samples': len(condition_metagenes),
+                                                     'bin': range(num_bins),
+                                                     'mean': condition_metagenes.mean(axis=0),
+                                                     'std': condition_metagenes.std(axis=0)}))
+    if condition_summaries:
+        pd.concat(condition_summaries).to_csv(output_folder / 'condition_profiles.tsv', sep='\t', index=False)
+    logging.info("Computing metagene profiles finished.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--project_folder',
+                        default='/cellfile/datapublic/jkoubele/celegans_mutants')
+    parser.add_argument('--introns_bed_file',
+                        default='/cellfile/datapublic/jkoubele/reference_genomes/WBcel235/introns.bed')
+    parser.add_argument('--coverage_type', choices=['pairs', 'nascent_introns'], default='pairs')
+    parser.add_argument('--num_bins', type=int, default=100)
+    parser.add_argument('--padding', type=int, default=20)
+    parser.add_argument('--min_length', type=int, default=50)
+    parser.add_argument('--condition_columns', nargs='+', default=None,
+                        help='Columns of the sample annotation by which the profiles are summarized.')
+    parser.add_argument('--num_processes', type=int, default=None)
+    args = parser.parse_args()
+    compute_metagene_profiles(project_folder=Path(args.project_folder),
+                              introns_bed_file=Path(args.introns_bed_file),
+                              coverage_type=args.coverage_type,
+                              num_bins=args.num_bins,
+                              padding=args.padding,
+                              min_length=args.min_length,
+                              condition_columns=args.condition_columns,
+                              num_processes=args.num_processes)
@@ -52,13 +52,17 @@ class IntronsIndex:
         introns_df = pd.read_csv(introns_bed_file, sep='\t',
                                  names=['chromosome', 'start', 'end', 'name', 'score', 'strand'])
         introns_df['chromosome'] = introns_df['chromosome'].astype(str)
+        introns_df = introns_df.reset_index(drop=True)
+        self.introns_df = introns_df
+        self.row_by_intron: dict[GenomicRange, int] = {}
         logging.info(f"Loading introns for indexing")
-        for _, row in introns_df.iterrows():
+        for row_number, row in introns_df.iterrows():
             intron = GenomicRange(chromosome=row['chromosome'], start=row['start'], end=row['end'],
                                   strand=row['strand'])
             chrom_and_strand = ChromsomeAndStrand(chromosome=row['chromosome'], strand=row['strand'])
             self.index_by_chrom_and_strand[chrom_and_strand][
                 len(self.index_by_chrom_and_strand[chrom_and_strand]) + 1] = intron
+            self.row_by_intron[intron] = row_number
         largest_index = max([max(numeric_index.keys()) if numeric_index.keys() else 0
                              for numeric_index in self.index_by_chrom_and_strand.values()])
         selected_int_type = np.uint16 if largest_index <= np.iinfo(np.uint16).max else np.uint32
@@ -78,6 +82,65 @@ class IntronsIndex:
         return self.index_by_chrom_and_strand[chrom_and_strand][index] if index != 0 else None
 
 
+class IntronPolymeraseCounts:
+    """
+    Counts of suspected polymerase positions per intron, accumulated directly during the extraction of read pairs.
+    The count of polymerases located between the paddings of an intron is equal to
+    coverage_5_prime - coverage_3_prime computed by estimate_intron_slopes.R from the nascent introns coverage.
+    """
+
+    def __init__(self, introns_index: IntronsIndex, padding: int = 20, min_length: int = 50,
+                 num_position_bins: int = 10) -> None:
+        self.introns_index = introns_index
+        self.padding = padding
+        self.min_length = min_length
+        self.num_position_bins = num_position_bins
+        num_introns = len(introns_index.introns_df)
+        self.counts_5_prime_padding = np.zeros(num_introns, dtype=np.uint32)
+        self.counts_3_prime_padding = np.zeros(num_introns, dtype=np.uint32)
+        self.position_counts = np.zeros((num_introns, num_position_bins), dtype=np.uint32)
+
+    def get_window(self, intron: GenomicRange) -> tuple[int, int]:
+        # Window between the paddings, with positions matching the (1-based) coverage lookup in
+        # compute_slope_from_definition() of estimate_intron_slopes.R
+        if intron.strand == '+':
+            return intron.start + self.padding - 1, intron.end - self.padding - 1
+        else:
+            return intron.start + self.padding, intron.end - self.padding
+
+    def add_polymerase(self, intron: GenomicRange, polymerase_position: int) -> None:
+        row = self.introns_index.row_by_intron[intron]
+        window_start, window_end = self.get_window(intron)
+        if window_start <= polymerase_position < window_end:
+            distance_from_5_prime = (polymerase_position - window_start if intron.strand == '+'
+                                     else window_end - 1 - polymerase_position)
+            position_bin = distance_from_5_prime * self.num_position_bins // (window_end - window_start)
+            self.position_counts[row, position_bin] += 1
+        elif (polymerase_position < window_start) == (intron.strand == '+'):
+            self.counts_5_prime_padding[row] += 1
+        else:
+            self.counts_3_prime_padding[row] += 1
+
+    def save(self, output_folder: Path) -> None:
+        """
+        Saves the counts to 'intron_counts.tsv' (one row per intron, in the order of the introns .bed file) and the
+        positional counts (binned from 5' to 3' end of the window between paddings) to 'intron_position_counts.npy'.
+        Counts of introns too short for the slope estimation are set to NA, the same as in estimate_intron_slopes.R.
+        :param output_folder: Folder to which the counts will be written.
+        :return: None.
+        """
+        counts_df = self.introns_index.introns_df[['chromosome', 'start', 'end', 'strand', 'name']].copy()
+        counts_df['length'] = counts_df['end'] - counts_df['start']
+        counts_df['count'] = pd.Series(self.position_counts.sum(axis=1), dtype='Int64')
+        counts_df.loc[(counts_df['length'] <= self.min_length) | (counts_df['length'] <= 2 * self.padding),
+                      'count'] = np.nan
+        counts_df['count_5_prime_padding'] = self.counts_5_prime_padding
+        counts_df['count_3_prime_padding'] = self.counts_3_prime_padding
+        counts_df['padding'] = self.padding
+        counts_df.to_csv(output_folder / 'intron_counts.tsv', sep='\t', index=False)
+        np.save(output_folder / 'intron_position_counts.npy', self.position_counts)
+
+
 def read_is_in_forward_pair(read: pysam.AlignedSegment, strandendess_type: str) -> bool:
     assert strandendess_type in ['1', '2'], "strandendess_type must be either '1' or '2'"
     if strandendess_type == '1':
@@ -109,7 +172,10 @@ def extract_and_save_unique_pairs(input_folder: Path,
                                   strandendess_type: str,
                                   introns_bed_file: Path,
                                   fai_index_file: Path,
-                                  bam_file_name="Aligned.sortedByCoord.out.bam"
+                                  bam_file_name="Aligned.sortedByCoord.out.bam",
+                                  count_introns: bool = False,
+                                  padding: int = 20,
+                                  num_position_bins: int = 10
                                   ) -> None:
     assert strandendess_type in ['1', '2'], "strandendess_type must be either '1' or '2'"
 
@@ -144,6 +210,8 @@ def extract_and_save_unique_pairs(input_folder: Path,
     bamfile_input = pysam.AlignmentFile(bamfile_input_path, "rb")
 
     introns_index = IntronsIndex(introns_bed_file, fai_index_file)
+    intron_counts = IntronPolymeraseCounts(introns_index, padding=padding,
+                                           num_position_bins=num_position_bins) if count_introns else None
 
     valid_reads_forward = 0
     valid_reads_reverse = 0
@@ -198,6 +266,9 @@ def extract_and_save_unique_pairs(input_folder: Path,
                                                                        strand='+',
                                                                        position=suspected_polymerase_position)
             if overlapping_intron is not None:
+                if intron_counts is not None:
+                    intron_counts.add_polymerase(intron=overlapping_intron,
+                                                 polymerase_position=suspected_polymerase_position)
                 intervals_forward_nascent_introns.append(GenomicRange(chromosome=read_1.reference_name,
                                                                       start=overlapping_intron.start,
                                                                       end=suspected_polymerase_position + 1,
@@ -215,6 +286,9 @@ def extract_and_save_unique_pairs(input_folder: Path,
                                                                        strand='-',
                                                                        position=suspected_polymerase_position)
             if overlapping_intron is not None:
+                if intron_counts is not None:
+                    intron_counts.add_polymerase(intron=overlapping_intron,
+                                                 polymerase_position=suspected_polymerase_position)
                 intervals_reverse_nascent_introns.append(GenomicRange(chromosome=read_1.reference_name,
                                                                       start=suspected_polymerase_position,
                                                                       end=overlapping_intron.end,
@@ -233,6 +307,9 @@ def extract_and_save_unique_pairs(input_folder: Path,
                    'selected_reads_reverse': valid_reads_reverse},
                   output_json_file)
 
+    if intron_counts is not None:
+        intron_counts.save(output_folder)
+
     # Write .bam files
     bamfile_input = pysam.AlignmentFile(bamfile_input_path, "rb")
     bamfile_output_forward = pysam.AlignmentFile(output_bam_file_forward_path, "wb",
@@ -270,9 +347,16 @@ if __name__ == "__main__":
     parser.add_argument('--strandendess_type')
     parser.add_argument('--introns_bed_file')
     parser.add_argument('--fai_index_file')
+    parser.add_argument('--count_introns', action='store_true',
+                        help='Also save counts of suspected polymerase positions per intron.')
+    parser.add_argument('--padding', type=int, default=20)
+    parser.add_argument('--num_position_bins', type=int, default=10)
     args = parser.parse_args()
     extract_and_save_unique_pairs(input_folder=Path(args.input_folder),
                                   output_folder=Path(args.output_folder),
                                   strandendess_type=args.strandendess_type,
                                   introns_bed_file=Path(args.introns_bed_file),
-                                  fai_index_file=Path(args.fai_index_file))
+                                  fai_index_file=Path(args.fai_index_file),
+                                  count_introns=args.count_introns,
+                                  padding=args.padding,
+                                  num_position_bins=args.num_position_bins)